@@ -4,7 +4,8 @@ import json
 import time
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from .llm_processor import LLMProcessor
+from openai import RateLimitError
+from .llm_processor import LLMProcessor, json_loads, rate_limit_delay, strip_code_fences
 from .openai_vector_search import OpenAIVectorSearch
 from .block_prompts import (
     BLOCK1_PROMPT,
@@ -15,6 +16,9 @@ from .block_prompts import (
 )
 
 
+_WORD_RE = re.compile(r'\w+')
+
+
 LENGTH_PROFILES = {
     'concise': {
         'block1': {'min': 150, 'max': 300, 'tokens': 1500},
@@ -56,7 +60,7 @@ class BlockGenerator:
 
     def _count_words(self, text: str) -> int:
         """Count words in text"""
-        return len(re.findall(r'\w+', text))
+        return len(_WORD_RE.findall(text))
 
     def _prepare_prompt_data(self, testimony: Dict, design: Dict, context: Dict) -> Dict:
         """
@@ -102,10 +106,12 @@ class BlockGenerator:
                 )
                 content = response.choices[0].message.content
                 return content if content else ""
-            except Exception as e:
-                if "429" in str(e) and attempt < 2:
-                    time.sleep(2 ** attempt)
+            except RateLimitError as e:
+                if attempt < 2:
+                    time.sleep(rate_limit_delay(e, attempt))
                     continue
+                raise
+            except Exception as e:
                 if attempt == 2:
                     raise e
         return ""
@@ -200,12 +206,14 @@ ESCREVA MUITO MAIS CONTEÚDO. SEJA EXTREMAMENTE DETALHADO.
 Cada seção deve ter MÚLTIPLOS parágrafos longos.
 NÃO SEJA BREVE. SEJA EXTENSIVO."""
 
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = (2 ** attempt)
-                    print(f"⏳ Rate limit, waiting {wait_time}s...")
+            except RateLimitError as e:
+                if attempt < max_retries - 1:
+                    wait_time = rate_limit_delay(e, attempt)
+                    print(f"⏳ Rate limit, waiting {wait_time:.1f}s...")
                     time.sleep(wait_time)
                     continue
+                raise
+            except Exception as e:
                 if attempt == max_retries - 1:
                     raise e
 
@@ -223,14 +231,7 @@ NÃO SEJA BREVE. SEJA EXTENSIVO."""
 
         try:
             content = self._call_llm_with_retry(prompt, temperature=0.9, max_tokens=config['tokens'], min_words=config['min'], max_words=config['max'])
-            content = content.strip()
-            if content.startswith('```markdown'):
-                content = content.split('```markdown', 1)[1]
-            if content.startswith('```'):
-                content = content.split('```', 1)[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
+            content = strip_code_fences(content)
 
             word_count = self._count_words(content)
             print(f"    ✓ Block 1 generated: {word_count} words")
@@ -247,14 +248,7 @@ NÃO SEJA BREVE. SEJA EXTENSIVO."""
 
         try:
             content = self._call_llm_with_retry(prompt, temperature=0.9, max_tokens=config['tokens'], min_words=config['min'], max_words=config['max'])
-            content = content.strip()
-            if content.startswith('```markdown'):
-                content = content.split('```markdown', 1)[1]
-            if content.startswith('```'):
-                content = content.split('```', 1)[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
+            content = strip_code_fences(content)
 
             word_count = self._count_words(content)
             print(f"    ✓ Block 2 generated: {word_count} words")
@@ -278,7 +272,7 @@ NÃO SEJA BREVE. SEJA EXTENSIVO."""
         try:
             content = self._call_llm_with_retry(prompt, temperature=0.9, max_tokens=config['tokens'], min_words=config['min'], max_words=config['max'])
             try:
-                data = json.loads(content)
+                data = json_loads(content)
                 draft = data.get('markdown_draft', content)
                 word_count = self._count_words(draft)
                 if word_count < config['min']:
@@ -305,14 +299,7 @@ NÃO SEJA BREVE. SEJA EXTENSIVO."""
 
         try:
             content = self._call_llm_with_retry(prompt, temperature=0.9, max_tokens=config['tokens'], min_words=config['min'], max_words=config['max'])
-            content = content.strip()
-            if content.startswith('```markdown'):
-                content = content.split('```markdown', 1)[1]
-            if content.startswith('```'):
-                content = content.split('```', 1)[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
+            content = strip_code_fences(content)
 
             word_count = self._count_words(content)
             print(f"    ✓ Block 4 generated: {word_count} words")
@@ -329,14 +316,7 @@ NÃO SEJA BREVE. SEJA EXTENSIVO."""
 
         try:
             content = self._call_llm_with_retry(prompt, temperature=0.9, max_tokens=config['tokens'], min_words=config['min'], max_words=config['max'])
-            content = content.strip()
-            if content.startswith('```markdown'):
-                content = content.split('```markdown', 1)[1]
-            if content.startswith('```'):
-                content = content.split('```', 1)[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
+            content = strip_code_fences(content)
 
             word_count = self._count_words(content)
             print(f"    ✓ Block 5 generated: {word_count} words")
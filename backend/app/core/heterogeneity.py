@@ -7,6 +7,8 @@ import json
 import time
 import random
 
+from .llm_processor import json_loads, rate_limit_delay
+
 
 class HeterogeneityArchitect:
     """
@@ -158,7 +160,7 @@ Return ONLY valid JSON with this structure:
                 )
                 
                 content = response.choices[0].message.content
-                result = json.loads(content)
+                result = json_loads(content)
                 
                 # Validation: count must match
                 design_structures = result.get('design_structures', [])
@@ -220,8 +222,8 @@ Return ONLY valid JSON with this structure:
                 raise
             except Exception as e:
                 if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 3
-                    print(f"⏳ Rate limit, waiting {wait_time}s...")
+                    wait_time = rate_limit_delay(e, attempt)
+                    print(f"⏳ Rate limit, waiting {wait_time:.1f}s...")
                     time.sleep(wait_time)
                     continue
                 if attempt == max_retries - 1:
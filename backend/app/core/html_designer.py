@@ -3,13 +3,70 @@ HTML Designer Agent - AI-powered custom HTML/CSS design generator
 Replaces template system with dynamic, truly heterogeneous HTML generation
 """
 from typing import Dict, Optional
+from collections import defaultdict
 import logging
-import base64
 import os
 
+from .html_pdf_generator import logo_data_uri
+from .llm_processor import strip_code_fences
+
 logger = logging.getLogger(__name__)
 
 
+# Layout of block content handed to the designer; filled with str.format_map
+_COMBINED_CONTENT_TEMPLATE = (
+    '\n## Block 3 (Introduction & Context)\n{block3}'
+    '\n\n## Block 4 (Technical Details & Achievements)\n{block4}'
+    '\n\n## Block 5 (Impact & Results)\n{block5}'
+    '\n\n## Block 6 (Validation & Evidence)\n{block6}'
+    '\n\n## Block 7 (Conclusion & Recommendation)\n{block7}\n'
+)
+
+# Invariant framing of the HTML design prompt, hoisted out of _build_design_prompt
+_DESIGN_PROMPT_HEADER = """# ROLE
+You are the world's best HTML Document Designer for professional letters of recommendation.
+
+Your job is to **DESIGN** - not assemble from templates, but CREATE a completely unique HTML document with custom CSS that brings this letter to life visually.
+
+# CRITICAL INSTRUCTIONS
+
+🚨 **OUTPUT ONLY THE RAW HTML CODE**
+- Start with `<!DOCTYPE html>`
+- Include complete `<html>`, `<head>`, `<style>`, and `<body>` tags
+- DO NOT wrap in JSON, do NOT escape newlines, do NOT add markdown code fences
+- Just pure, clean, valid HTML ready for PDF conversion
+
+🎨 **DESIGN PARAMETERS TO IMPLEMENT**
+You have been given a 23-parameter design structure. Your job is to INTERPRET these creatively:
+
+"""
+
+_DESIGN_PROMPT_FOOTER = """
+
+# STRUCTURE TEMPLATE
+
+Your HTML should include:
+1. DOCTYPE and full html structure
+2. <head> with meta charset, title, and comprehensive <style> block
+3. <body> with:
+   - Header section (logo if available, recommender info, date)
+   - Greeting ("To Whom It May Concern:" or appropriate)
+   - Content sections with ALL blocks formatted beautifully
+   - Signature block with recommender details
+4. Proper closing tags
+
+# CRITICAL REMINDERS
+
+- Output ONLY HTML (no explanations, no markdown wrappers)
+- Start with `<!DOCTYPE html>`
+- Include ALL content from the blocks
+- Make it UNIQUE - this is a custom design
+- It must be PRINTABLE and beautiful on paper
+- Use the design parameters to create visual differentiation
+
+Generate the complete HTML document now:"""
+
+
 class HTMLDesigner:
     """
     AI-powered HTML designer that generates completely unique letter designs.
@@ -22,30 +79,15 @@ class HTMLDesigner:
 
     def _embed_logo_as_base64(self, logo_path: str) -> Optional[str]:
         """Convert logo to base64 data URI for embedding"""
-        if not logo_path or not os.path.exists(logo_path):
+        if not logo_path:
             return None
 
         try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-
-            ext = os.path.splitext(logo_path)[1].lower()
-            mime_types = {
-                '.png': 'image/png',
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.gif': 'image/gif',
-                '.svg': 'image/svg+xml',
-                '.webp': 'image/webp'
-            }
-            mime = mime_types.get(ext, 'image/png')
-
-            b64_data = base64.b64encode(logo_data).decode('utf-8')
-            data_uri = f'data:{mime};base64,{b64_data}'
-
-            logger.info(f"Logo embedded as base64 ({len(b64_data)} chars)")
-            return data_uri
-
+            st = os.stat(logo_path)
+            return logo_data_uri(logo_path, st.st_mtime, st.st_size)
+        except FileNotFoundError:
+            # Missing logo is not an error
+            return None
         except Exception as e:
             logger.error(f"Failed to embed logo: {e}")
             return None
@@ -77,22 +119,7 @@ class HTMLDesigner:
         logo_base64 = self._embed_logo_as_base64(logo_path) if logo_path else None
 
         # Prepare content blocks
-        combined_content = f"""
-## Block 3 (Introduction & Context)
-{blocks.get('block3', '')}
-
-## Block 4 (Technical Details & Achievements)
-{blocks.get('block4', '')}
-
-## Block 5 (Impact & Results)
-{blocks.get('block5', '')}
-
-## Block 6 (Validation & Evidence)
-{blocks.get('block6', '')}
-
-## Block 7 (Conclusion & Recommendation)
-{blocks.get('block7', '')}
-"""
+        combined_content = _COMBINED_CONTENT_TEMPLATE.format_map(defaultdict(str, blocks))
 
         # Build the design generation prompt
         prompt = self._build_design_prompt(
@@ -111,17 +138,8 @@ class HTMLDesigner:
                 max_tokens=16000
             )
 
-            html_output = response.choices[0].message.content.strip()
-
             # Clean up if LLM wrapped in markdown code blocks
-            if html_output.startswith('```html'):
-                html_output = html_output.replace('```html', '', 1)
-            if html_output.startswith('```'):
-                html_output = html_output.replace('```', '', 1)
-            if html_output.endswith('```'):
-                html_output = html_output.rsplit('```', 1)[0]
-
-            html_output = html_output.strip()
+            html_output = strip_code_fences(response.choices[0].message.content)
 
             # Validate output starts with DOCTYPE
             if not html_output.startswith('<!DOCTYPE'):
@@ -188,23 +206,9 @@ Place the logo strategically in the header. Example:
 ```
 """
 
-        prompt = f"""# ROLE
-You are the world's best HTML Document Designer for professional letters of recommendation.
-
-Your job is to **DESIGN** - not assemble from templates, but CREATE a completely unique HTML document with custom CSS that brings this letter to life visually.
-
-# CRITICAL INSTRUCTIONS
-
-🚨 **OUTPUT ONLY THE RAW HTML CODE**
-- Start with `<!DOCTYPE html>`
-- Include complete `<html>`, `<head>`, `<style>`, and `<body>` tags
-- DO NOT wrap in JSON, do NOT escape newlines, do NOT add markdown code fences
-- Just pure, clean, valid HTML ready for PDF conversion
-
-🎨 **DESIGN PARAMETERS TO IMPLEMENT**
-You have been given a 23-parameter design structure. Your job is to INTERPRET these creatively:
-
-**Visual Design:**
+        prompt = "".join([
+            _DESIGN_PROMPT_HEADER,
+            f"""**Visual Design:**
 - Template Style: {template_id}
 - Layout Pattern: {layout_pattern}
 - Font Primary: {font_primary}
@@ -292,29 +296,8 @@ Follow the tone: **{tone_variable}**
 {tone_instructions}
 
 Structure paragraphs according to: {paragraph_density}
-Use emphasis pattern: {emphasis_pattern}
-
-# STRUCTURE TEMPLATE
-
-Your HTML should include:
-1. DOCTYPE and full html structure
-2. <head> with meta charset, title, and comprehensive <style> block
-3. <body> with:
-   - Header section (logo if available, recommender info, date)
-   - Greeting ("To Whom It May Concern:" or appropriate)
-   - Content sections with ALL blocks formatted beautifully
-   - Signature block with recommender details
-4. Proper closing tags
-
-# CRITICAL REMINDERS
-
-- Output ONLY HTML (no explanations, no markdown wrappers)
-- Start with `<!DOCTYPE html>`
-- Include ALL content from the blocks
-- Make it UNIQUE - this is a custom design
-- It must be PRINTABLE and beautiful on paper
-- Use the design parameters to create visual differentiation
-
-Generate the complete HTML document now:"""
+Use emphasis pattern: {emphasis_pattern}""",
+            _DESIGN_PROMPT_FOOTER,
+        ])
 
         return prompt
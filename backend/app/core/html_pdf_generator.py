@@ -1,46 +1,386 @@
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 try:
     from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
 except OSError:
     print("WARNING: WeasyPrint system dependencies not found. PDF generation will fail.")
     HTML = None
     CSS = None
-from typing import Dict, Optional
+    FontConfiguration = None
+try:
+    # Function-style fetcher API; WeasyPrint 70 replaced it with URLFetcher classes
+    from weasyprint import default_url_fetcher
+except (ImportError, OSError):
+    default_url_fetcher = None
+from typing import Dict, List, Optional, Tuple
 import os
 from datetime import datetime
 import uuid
+import mimetypes
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from io import BytesIO
+from functools import lru_cache
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
+import re
 try:
-    from html4docx import HtmlToDocx
+    # SIMD base64 when available; stdlib output is identical
+    from pybase64 import b64encode
 except ImportError:
-    print("WARNING: html4docx not found or incompatible. DOCX generation will fail.")
-    HtmlToDocx = None
-import re
-import base64
+    from base64 import b64encode
+from html import unescape
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 STORAGE_BASE_DIR = os.getenv('STORAGE_BASE_DIR', 'backend/storage')
+JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR')  # Compiled template bytecode; unset = Jinja's private per-user temp dir
+MAX_PDF_WORKERS = int(os.getenv('MAX_PDF_WORKERS', os.cpu_count() or 1))  # WeasyPrint is CPU-bound, one process per core
+_PDF_MP_CONTEXT = multiprocessing.get_context('spawn')  # Pango/fontconfig state is not fork-safe
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '../templates')
+
+# html_to_pdf page wrapper: Jinja template and its stylesheet, under app/templates
+_WRAPPER_TEMPLATE = 'pdf_wrapper.html'
+_WRAPPER_CSS_PATH = os.path.join(TEMPLATE_DIR, 'pdf_wrapper.css')
+
+# Template ID -> Jinja template file under app/templates
+TEMPLATE_MAPPING = {
+    'A': 'template_a_technical.html',
+    'B': 'template_b_academic.html',
+    'C': 'template_c_narrative.html',
+    'D': 'template_d_business.html',
+    'E': 'template_e_usa_support.html',
+    'F': 'template_f_technical_testimony.html'
+}
+
+# Logo file extension -> data URI MIME type
+LOGO_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.webp': 'image/webp'
+}
+LOGO_STREAM_THRESHOLD = 64 * 1024  # Logos this large are read and base64-encoded in chunks
+PDF_WRITE_BUFFER = 1 << 20  # Buffered file handle WeasyPrint streams the PDF into
+PDF_JPEG_QUALITY = int(os.getenv('PDF_JPEG_QUALITY', 85))  # Re-encode quality for embedded JPEGs
+_B64_CHUNK_SIZE = 57 * 1024  # Multiple of 3, so no padding is emitted mid-stream
+
+# Wrapper tags the LLM must not emit (unwrapped, content kept) and tags that count as content
+_UNWRAP_TAGS = ('html', 'head', 'body')
+_DROP_TAGS = ('script', 'style')
+_CONTENT_TAGS = frozenset({'p', 'h1', 'h2', 'h3', 'div'})
+_DIRTY_HTML_RE = re.compile(r'<(?:html|head|body|script|style)\b|\sstyle\s*=', re.IGNORECASE)
+# Quoted style attribute, only inside a start tag (group 1 keeps the tag up to it) so text like 'style="x"' survives
+_STYLE_ATTR_RE = re.compile(r'''(<[A-Za-z][^>]*?)\s+style\s*=\s*(?:"[^"]*"|'[^']*')''', re.IGNORECASE)
+_CONTENT_TAG_RE = re.compile(r'<(?:p|h1|h2|h3|div)\b', re.IGNORECASE)
+
+# Tag stripping / paragraph detection for text-only quality checks
+_TAG_RE = re.compile(r'<[^>]+>')
+_P_TAG_RE = re.compile(r'<p\b', re.IGNORECASE)
+_WORD_RE = re.compile(r'\S+')
+
+# Quality-check terms, matched case-insensitively by a single alternation
+_PLACEHOLDER_TERMS = ('[INSERT]', '[TODO]', '[PLACEHOLDER]', 'Lorem ipsum', 'XXX', '###')
+_FORBIDDEN_TERMS = ('application', 'eb2-niw', 'eb2 niw', 'peticionário', 'visto', 'imigração')
+_QUALITY_TERMS_RE = re.compile(
+    '|'.join(re.escape(term) for term in sorted(_PLACEHOLDER_TERMS + _FORBIDDEN_TERMS, key=len, reverse=True)),
+    re.IGNORECASE
+)
+# (lowercased term, issue message) in report order, so validation does no per-term string work
+_QUALITY_TERM_ISSUES = tuple(
+    [(term.lower(), f"Placeholder text found: {term}") for term in _PLACEHOLDER_TERMS]
+    + [(term.lower(), f"Forbidden term found: {term}") for term in _FORBIDDEN_TERMS]
+)
+
+# Markup WeasyPrint would fetch or parse for nothing: scripts, media="screen"-only stylesheets, resource hints
+_SCRIPT_RE = re.compile(r'<script\b[^>]*>.*?</script\s*>', re.IGNORECASE | re.DOTALL)
+_FRAGMENT_CSS_RE = re.compile(r'<style\b[^>]*>.*?</style\s*>|<link\b[^>]*>', re.IGNORECASE | re.DOTALL)
+_PDF_IRRELEVANT_LINK_RE = re.compile(
+    r'<link\b(?=[^>]*(?:\bmedia\s*=\s*(?:"\s*screen\s*"|\'\s*screen\s*\'|screen(?=[\s/>]))'
+    r'|\brel\s*=\s*["\']?(?:icon|shortcut icon|preload|prefetch|preconnect|dns-prefetch|modulepreload|manifest)\b))[^>]*>',
+    re.IGNORECASE
+)
+
+# Output directories already created by this process
+_MADE_DIRS = set()
+
+
+def _ensure_dir(path: str):
+    """os.makedirs once per directory per process instead of a stat on every render"""
+    if path not in _MADE_DIRS:
+        os.makedirs(path, exist_ok=True)
+        _MADE_DIRS.add(path)
+
+
+def _b64_data_uri(path: str, size: int, mime: str) -> str:
+    """Build a base64 data URI in one preallocated buffer, decoded to str once at the end
+
+    Large files are encoded chunk by chunk so the raw bytes are never held whole.
+    """
+    prefix = f'data:{mime};base64,'.encode('ascii')
+    buf = bytearray(len(prefix) + ((size + 2) // 3) * 4)
+    buf[:len(prefix)] = prefix
+    pos = len(prefix)
+    with open(path, 'rb') as f:
+        if size < LOGO_STREAM_THRESHOLD:
+            chunks = (f.read(),)
+        else:
+            chunks = iter(lambda: f.read(_B64_CHUNK_SIZE), b'')
+        for chunk in chunks:
+            encoded = b64encode(chunk)
+            buf[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+    del buf[pos:]
+    return buf.decode('ascii')
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """
+    Bytecode cache that only this user can write to.
+
+    Cached bytecode is unmarshalled and executed, so a configured directory
+    must be private (owned by us, not group/world-writable); otherwise the
+    cache is disabled rather than trusting what is in it.
+    """
+    if not JINJA_CACHE_DIR:
+        # Jinja's default: a per-uid 0700 temp directory with an ownership check
+        return FileSystemBytecodeCache()
+    try:
+        os.makedirs(JINJA_CACHE_DIR, mode=0o700, exist_ok=True)
+        st = os.stat(JINJA_CACHE_DIR)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {e}")
+        return None
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        logger.warning(f"Jinja bytecode cache disabled: {JINJA_CACHE_DIR} is not private to this user")
+        return None
+    return FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+
+@lru_cache(maxsize=1)
+def _jinja_env() -> Environment:
+    """Process-wide Jinja environment; built once instead of per generator instance"""
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=_bytecode_cache(),
+        auto_reload=False,
+        cache_size=-1
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_template(template_id: str):
+    return _jinja_env().get_template(TEMPLATE_MAPPING[template_id])
+
+
+@lru_cache(maxsize=16)
+def logo_data_uri(logo_path: str, mtime: float, size: int) -> str:
+    """Base64 data URI for a logo file; keyed on mtime and size so a replaced logo is re-read"""
+    # Detect MIME type from file extension
+    ext = os.path.splitext(logo_path)[1].lower()
+    mime = LOGO_MIME_TYPES.get(ext, 'image/png')
+
+    # Convert to base64 (large logos in chunks to keep peak memory low)
+    data_uri = _b64_data_uri(logo_path, size, mime)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"Logo embedded as base64 ({((size + 2) // 3) * 4} chars, {mime})")
+    return data_uri
+
+
+# DOCX lengths, built once rather than per section/element
+_PAGE_MARGIN = Inches(1)
+_LOGO_WIDTH = Inches(2.5)
+_BLOCKQUOTE_INDENT = Inches(0.5)
+
+# Month names for letter dates, independent of the server locale
+_MONTHS_PT = ('janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho', 'julho',
+              'agosto', 'setembro', 'outubro', 'novembro', 'dezembro')
+_MONTHS_EN = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+              'August', 'September', 'October', 'November', 'December')
+
+# Style IDs of the list paragraph styles ('List Bullet'/'List Number') in the default template
+_LIST_STYLE_IDS = {'ul': 'ListBullet', 'ol': 'ListNumber'}
+
+# Character styles in the blank DOCX template for the recommender header block
+_HEADER_NAME_STYLE = 'ProexHeaderName'
+_HEADER_DETAIL_STYLE = 'ProexHeaderDetail'
+
+
+@lru_cache(maxsize=1)
+def _blank_docx_bytes() -> bytes:
+    """python-docx default template with page margins and shared header run styles, serialized once per process"""
+    doc = Document()
+    for section in doc.sections:
+        section.top_margin = _PAGE_MARGIN
+        section.bottom_margin = _PAGE_MARGIN
+        section.left_margin = _PAGE_MARGIN
+        section.right_margin = _PAGE_MARGIN
+
+    header_name = doc.styles.add_style(_HEADER_NAME_STYLE, WD_STYLE_TYPE.CHARACTER)
+    header_name.font.size = Pt(12)
+    header_name.font.bold = True
+    header_detail = doc.styles.add_style(_HEADER_DETAIL_STYLE, WD_STYLE_TYPE.CHARACTER)
+    header_detail.font.size = Pt(10)
+
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def _new_document():
+    """Fresh DOCX document (1in margins, header styles) built from the cached blank template bytes"""
+    return Document(BytesIO(_blank_docx_bytes()))
+
+
+def _wrap_letter_html(html_content: str, logo_uri: Optional[str], date_str: str, signature: Tuple[str, str, str, str]) -> str:
+    """Wrap letter body HTML in the PDF page shell"""
+    name, title, company, location = signature
+    return _jinja_env().get_template(_WRAPPER_TEMPLATE).render(
+        logo_data_uri=logo_uri,
+        date=date_str,
+        content=html_content,
+        name=name,
+        title=title,
+        company=company,
+        location=location
+    )
+
+
+def _strip_pdf_irrelevant(html: str) -> str:
+    """Drop <script> blocks and screen-only/resource-hint <link> tags before handing HTML to WeasyPrint"""
+    stripped = _PDF_IRRELEVANT_LINK_RE.sub('', _SCRIPT_RE.sub('', html))
+    removed = len(html) - len(stripped)
+    if removed:
+        logger.debug(f"Stripped {removed} bytes of PDF-irrelevant markup")
+    return stripped
+
+
+def _local_url_fetcher(url: str, *args, **kwargs):
+    """Read file:// resources straight from disk; everything else goes through WeasyPrint's fetcher"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'file' and parsed.netloc in ('', 'localhost'):
+        path = url2pathname(parsed.path)
+        with open(path, 'rb') as f:
+            return {
+                'string': f.read(),
+                'mime_type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                'redirected_url': url,
+            }
+    return default_url_fetcher(url, *args, **kwargs)
+
+
+# Disk shortcut only where WeasyPrint accepts function fetchers; otherwise its own fetcher reads file:// URLs
+_PDF_URL_FETCHER = _local_url_fetcher if default_url_fetcher is not None else None
+
+
+@lru_cache(maxsize=1)
+def _font_config():
+    """One fontconfig/Pango font setup per process, shared by every render and stylesheet"""
+    return FontConfiguration()
+
+
+def _write_pdf(html: str, output_path: str, stylesheets=None):
+    """
+    Render HTML to output_path through a buffered handle with image optimisation on.
+
+    Writes to a temp file beside the target and renames it into place, so a
+    failed render never leaves a truncated PDF at output_path.
+    """
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb', buffering=PDF_WRITE_BUFFER) as pdf_file:
+            HTML(string=html, url_fetcher=_PDF_URL_FETCHER).write_pdf(
+                target=pdf_file,
+                stylesheets=stylesheets,
+                font_config=_font_config(),
+                presentational_hints=False,
+                optimize_images=True,
+                jpeg_quality=PDF_JPEG_QUALITY
+            )
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@lru_cache(maxsize=1)
+def _letter_stylesheet():
+    """Parsed wrapper stylesheet, reused across renders instead of re-parsing an inline <style>"""
+    return CSS(filename=_WRAPPER_CSS_PATH, url_fetcher=_PDF_URL_FETCHER, font_config=_font_config())
+
+
+def _preload_weasyprint():
+    """Process-pool initializer: build the font configuration once per worker, not per job"""
+    if HTML is not None:
+        _font_config()
+
+
+def _render_pdf_job(complete_html: str, output_path: str) -> str:
+    """Process-pool worker: render one complete HTML document to PDF"""
+    HTMLPDFGenerator().html_to_pdf_direct(complete_html, output_path)
+    return output_path
+
+
+_pdf_pool_executor: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _pdf_pool() -> ProcessPoolExecutor:
+    """Shared WeasyPrint process pool, started on first use and reused for every letter"""
+    global _pdf_pool_executor
+    with _pdf_pool_lock:
+        if _pdf_pool_executor is None:
+            _pdf_pool_executor = ProcessPoolExecutor(
+                max_workers=MAX_PDF_WORKERS,
+                mp_context=_PDF_MP_CONTEXT,
+                initializer=_preload_weasyprint
+            )
+        return _pdf_pool_executor
+
+
+def _submit_pdf_job(complete_html: str, output_path: str) -> Future:
+    """Queue a PDF render on the shared pool, replacing the pool once if a dead worker broke it"""
+    global _pdf_pool_executor
+    pool = _pdf_pool()
+    try:
+        return pool.submit(_render_pdf_job, complete_html, output_path)
+    except BrokenProcessPool:
+        logger.warning("PDF process pool broken, starting a new one")
+        with _pdf_pool_lock:
+            if _pdf_pool_executor is pool:
+                _pdf_pool_executor = None
+        return _pdf_pool().submit(_render_pdf_job, complete_html, output_path)
+
 
 class HTMLPDFGenerator:
-    def __init__(self):
-        template_dir = os.path.join(os.path.dirname(__file__), '../templates')
-        self.env = Environment(loader=FileSystemLoader(template_dir))
-        
-        self.template_mapping = {
-            'A': 'template_a_technical.html',
-            'B': 'template_b_academic.html',
-            'C': 'template_c_narrative.html',
-            'D': 'template_d_business.html',
-            'E': 'template_e_usa_support.html',
-            'F': 'template_f_technical_testimony.html'
-        }
-    
+    # Shared by every instance; the Jinja environment is built on first access
+    template_mapping = TEMPLATE_MAPPING
+
+    @property
+    def env(self) -> Environment:
+        return _jinja_env()
+
+    def get_template(self, template_id: str):
+        """Compiled Jinja template for a template ID (A-F), cached per process"""
+        return _get_template(template_id)
+
     def assemble_letter(self, blocks: Dict[str, str], design: Dict, llm, custom_instructions: Optional[str] = None) -> str:
         """Assemble letter from blocks with AI refinement."""
         letter_content = "\n\n".join(blocks.values())
@@ -51,32 +391,16 @@ class HTMLPDFGenerator:
 
         This prevents file:// URI issues and embeds logo directly in document.
         """
-        if not logo_path or not os.path.exists(logo_path):
+        if not logo_path:
             return None
 
         try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-
-            # Detect MIME type from file extension
-            ext = os.path.splitext(logo_path)[1].lower()
-            mime_types = {
-                '.png': 'image/png',
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.gif': 'image/gif',
-                '.svg': 'image/svg+xml',
-                '.webp': 'image/webp'
-            }
-            mime = mime_types.get(ext, 'image/png')
-
-            # Convert to base64
-            b64_data = base64.b64encode(logo_data).decode('utf-8')
-            data_uri = f'data:{mime};base64,{b64_data}'
-
-            logger.info(f"Logo embedded as base64 ({len(b64_data)} chars, {mime})")
-            return data_uri
+            st = os.stat(logo_path)
+        except OSError:
+            return None
 
+        try:
+            return logo_data_uri(logo_path, st.st_mtime, st.st_size)
         except Exception as e:
             logger.error(f"Failed to embed logo as base64: {e}")
             return None
@@ -84,27 +408,33 @@ class HTMLPDFGenerator:
     def _validate_and_clean_html(self, html_content: str) -> str:
         """Validate and clean HTML content from LLM
 
-        - Removes forbidden tags (html, head, body, script, style)
+        - Unwraps html/head/body and removes script/style elements
         - Fixes malformed HTML structure
         - Ensures valid nesting
+
+        Inline style attributes (we use CSS classes instead) are stripped with a
+        regex first; output that is then well-behaved (no forbidden tags, has
+        content elements) is returned without a parse/serialize round-trip.
         """
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+        html_content = _STYLE_ATTR_RE.sub(r'\1', html_content)
+        if not _DIRTY_HTML_RE.search(html_content) and _CONTENT_TAG_RE.search(html_content):
+            return html_content
 
-            # Remove forbidden tags (keep content, remove wrapper)
-            for tag_name in ['html', 'head', 'body', 'script', 'style']:
-                for tag in soup.find_all(tag_name):
-                    tag.unwrap()
+        try:
+            tree = lxml_html.fragment_fromstring(html_content, create_parent='div')
 
-            # Remove inline style attributes (we use CSS classes instead)
-            for tag in soup.find_all(style=True):
-                del tag['style']
+            # C-level tree edits: unwrap document wrappers (keep content), drop
+            # script/style entirely, drop any unquoted style attributes the regex missed
+            etree.strip_tags(tree, *_UNWRAP_TAGS)
+            etree.strip_elements(tree, *_DROP_TAGS, with_tail=False)
+            etree.strip_attributes(tree, 'style')
 
             # Validate basic structure
-            if not soup.find(['p', 'h1', 'h2', 'h3', 'div']):
+            if next(tree.iterdescendants(*_CONTENT_TAGS), None) is None:
                 raise ValueError("No content elements found in HTML")
 
-            cleaned_html = str(soup)
+            # Serialize without the wrapper <div>
+            cleaned_html = lxml_html.tostring(tree, encoding='unicode')[len('<div>'):-len('</div>')]
             logger.debug(f"HTML cleaned: {len(html_content)} → {len(cleaned_html)} chars")
             return cleaned_html
 
@@ -117,31 +447,35 @@ class HTMLPDFGenerator:
 
         Returns dict with 'valid', 'issues', and 'score' keys
         """
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text()
+        # Text-only checks don't need a parse tree; tags are removed without a separator, as get_text() did,
+        # so terms split by inline markup (<b>vis</b>to, <strong>EB2</strong> NIW) still match
+        text = unescape(_TAG_RE.sub('', html))
         issues = []
 
         # Check minimum content length
-        word_count = len(text.split())
+        word_count = sum(1 for _ in _WORD_RE.finditer(text))
+
+        # Obviously broken output (empty, truncated, runaway): skip the remaining checks
+        if word_count < 500 or word_count > 5000:
+            return {
+                'valid': False,
+                'issues': [f"Word count out of range: {word_count}"],
+                'score': 0,
+                'word_count': word_count
+            }
+
         if word_count < 1800:
             issues.append(f"Word count too low: {word_count} < 1800")
         elif word_count > 2800:
             issues.append(f"Word count too high: {word_count} > 2800")
 
-        # Check for placeholder text
-        placeholders = ['[INSERT]', '[TODO]', '[PLACEHOLDER]', 'Lorem ipsum', 'XXX', '###']
-        for placeholder in placeholders:
-            if placeholder.lower() in text.lower():
-                issues.append(f"Placeholder text found: {placeholder}")
-
-        # Check for forbidden terms
-        forbidden = ['application', 'eb2-niw', 'eb2 niw', 'peticionário', 'visto', 'imigração']
-        for term in forbidden:
-            if term.lower() in text.lower():
-                issues.append(f"Forbidden term found: {term}")
+        # Placeholder text and forbidden terms, found in one pass over the text
+        found = {match.group(0).lower() for match in _QUALITY_TERMS_RE.finditer(text)}
+        if found:
+            issues.extend(issue for term, issue in _QUALITY_TERM_ISSUES if term in found)
 
         # Check that we have actual content structure
-        if not soup.find('p'):
+        if not _P_TAG_RE.search(html):
             issues.append("No paragraphs found")
 
         # Calculate quality score (100 - 10 points per issue)
@@ -165,71 +499,31 @@ class HTMLPDFGenerator:
     ):
         """Convert HTML to PDF with logo and formatting - no templates"""
         
+        # The fragment is styled by the wrapper stylesheet; drop its own CSS so WeasyPrint doesn't parse it
+        html_content = _STYLE_ATTR_RE.sub(r'\1', _FRAGMENT_CSS_RE.sub('', _strip_pdf_irrelevant(html_content)))
+
         # Embed logo as base64
-        logo_data_uri = self._embed_logo_as_base64(logo_path) if logo_path else None
+        logo_uri = self._embed_logo_as_base64(logo_path) if logo_path else None
         
         # Build full HTML with logo header
-        logo_html = ""
-        if logo_data_uri:
-            logo_html = f'<img src="{logo_data_uri}" style="height: 50px; margin-bottom: 20px;" />'
-        
-        full_html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-            max-width: 8.5in;
-            margin: 0.5in;
-            padding: 0;
-            color: #333;
-        }}
-        h2 {{
-            font-size: 13pt;
-            margin-top: 20px;
-            margin-bottom: 10px;
-            font-weight: bold;
-            border-bottom: 1px solid #ddd;
-            padding-bottom: 5px;
-        }}
-        p {{
-            margin-bottom: 10px;
-            text-align: justify;
-        }}
-        .header {{
-            margin-bottom: 20px;
-            border-bottom: 2px solid #333;
-            padding-bottom: 10px;
-        }}
-        .signature {{
-            margin-top: 30px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        {logo_html}
-        <p><strong>Data:</strong> {datetime.now().strftime('%d de %B de %Y')}</p>
-    </div>
-    
-    {html_content}
-    
-    <div class="signature">
-        <p><strong>{recommender_info.get('name', 'Professional Recommender') if recommender_info else 'Professional Recommender'}</strong></p>
-        <p>{recommender_info.get('title', '') if recommender_info else ''}</p>
-        <p>{recommender_info.get('company', '') if recommender_info else ''}</p>
-        <p>{recommender_info.get('location', '') if recommender_info else ''}</p>
-    </div>
-</body>
-</html>"""
+        today = datetime.now()
+        date_str = f"{today.day:02d} de {_MONTHS_PT[today.month - 1]} de {today.year}"
+        info = recommender_info or {}
+        signature = (
+            info.get('name', 'Professional Recommender'),
+            info.get('title', ''),
+            info.get('company', ''),
+            info.get('location', ''),
+        )
+        full_html = _wrap_letter_html(
+            html_content, logo_uri, date_str, signature
+        )
         
         # Create output directory
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        _ensure_dir(os.path.dirname(output_path))
         
         # Convert to PDF
-        HTML(string=full_html).write_pdf(output_path)
+        _write_pdf(full_html, output_path, stylesheets=[_letter_stylesheet()])
         
         print(f"✅ PDF generated: {os.path.basename(output_path)}")
 
@@ -245,115 +539,214 @@ class HTMLPDFGenerator:
         if HTML is None:
             raise RuntimeError("WeasyPrint not available - cannot generate PDF")
 
+        complete_html = _strip_pdf_irrelevant(complete_html)
+
         # Create output directory
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        _ensure_dir(os.path.dirname(output_path))
 
         # Convert to PDF directly
         try:
-            HTML(string=complete_html).write_pdf(output_path)
+            _write_pdf(complete_html, output_path)
             logger.info(f"PDF generated: {os.path.basename(output_path)}")
             print(f"✅ PDF generated: {os.path.basename(output_path)}")
         except Exception as e:
             logger.error(f"PDF generation failed: {e}")
             raise ValueError(f"Failed to generate PDF: {e}")
 
+    def generate_batch(self, jobs: List[Tuple[str, str, str]]) -> List[Tuple[str, str]]:
+        """
+        Generate PDF and DOCX for several letters.
+
+        PDFs are fanned out to the shared process pool while the DOCX files are
+        built in the calling thread, so both conversions overlap across the batch.
+
+        Args:
+            jobs: List of (complete_html, pdf_path, docx_path) tuples
+
+        Returns:
+            (pdf_path, docx_path) pairs in the same order as jobs
+        """
+        if HTML is None:
+            raise RuntimeError("WeasyPrint not available - cannot generate PDF")
+
+        futures = [_submit_pdf_job(complete_html, pdf_path) for complete_html, pdf_path, _ in jobs]
+        for complete_html, _, docx_path in jobs:
+            self.html_to_docx_direct(complete_html, docx_path)
+        return [(future.result(), docx_path) for future, (_, _, docx_path) in zip(futures, jobs)]
+
+    def generate_both(self, complete_html: str, pdf_path: str, docx_path: str) -> Tuple[str, str]:
+        """
+        Generate the PDF and the editable DOCX for one letter concurrently.
+
+        The WeasyPrint render runs in the shared worker pool while python-docx
+        builds the DOCX in the calling thread, so the two CPU-bound conversions
+        overlap; letters generated from parallel threads share the same workers.
+
+        Args:
+            complete_html: Complete HTML document string (DOCTYPE to </html>)
+            pdf_path: Path for output PDF file
+            docx_path: Path for output DOCX file
+
+        Returns:
+            (pdf_path, docx_path)
+        """
+        if HTML is None:
+            raise RuntimeError("WeasyPrint not available - cannot generate PDF")
+
+        pdf_future = _submit_pdf_job(complete_html, pdf_path)
+        self.html_to_docx_direct(complete_html, docx_path)
+        return pdf_future.result(), docx_path
+
+    @staticmethod
+    def _docx_items(element, paragraph):
+        """Yield (node, paragraph) for an lxml element's text, children and their tails in document order"""
+        if element.text:
+            yield element.text, paragraph
+        for child in element:
+            yield child, paragraph
+            if child.tail:
+                yield child.tail, paragraph
+
     def _process_html_element_to_docx(self, element, doc, paragraph=None):
-        """Recursively process HTML element and add to DOCX document with formatting preservation"""
-        from docx.oxml.ns import qn
-        from docx.oxml import OxmlElement
-
-        if isinstance(element, str):
-            # Text node
-            if paragraph:
-                run = paragraph.add_run(element)
-                return run
-            else:
-                p = doc.add_paragraph(element)
-                return p
-
-        tag = element.name if hasattr(element, 'name') else None
-
-        if tag == 'p':
-            p = doc.add_paragraph()
-            p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            for child in element.children:
-                self._process_html_element_to_docx(child, doc, p)
-            return p
-
-        elif tag in ['h1', 'h2', 'h3'] and tag:
-            level = int(tag[1]) if tag and len(tag) > 1 else 1
-            text = element.get_text()
-            p = doc.add_heading(text, level=level)
-            return p
-
-        elif tag in ['strong', 'b']:
-            if paragraph:
-                text = element.get_text()
-                run = paragraph.add_run(text)
-                run.bold = True
-                return run
-
-        elif tag in ['em', 'i']:
-            if paragraph:
-                text = element.get_text()
-                run = paragraph.add_run(text)
-                run.italic = True
-                return run
-
-        elif tag in ['ul', 'ol']:
-            for li in element.find_all('li', recursive=False):
-                p = doc.add_paragraph(style='List Bullet' if tag == 'ul' else 'List Number')
-                for child in li.children:
-                    self._process_html_element_to_docx(child, doc, p)
-
-        elif tag == 'table':
-            rows = element.find_all('tr')
-            if not rows:
-                return None
-
-            # Count columns
-            first_row = rows[0]
-            cols = len(first_row.find_all(['th', 'td']))
-
-            table = doc.add_table(rows=len(rows), cols=cols)
-            table.style = 'Light Grid Accent 1'
-
-            for i, row in enumerate(rows):
-                cells = row.find_all(['th', 'td'])
-                for j, cell in enumerate(cells):
-                    table.rows[i].cells[j].text = cell.get_text()
-                    # Bold header cells
-                    if cell.name == 'th':
-                        for paragraph in table.rows[i].cells[j].paragraphs:
-                            for run in paragraph.runs:
-                                run.bold = True
-
-            return table
-
-        elif tag == 'br':
-            if paragraph:
-                paragraph.add_run('\n')
-
-        elif tag == 'blockquote':
+        """Add an lxml HTML element (or text node) and its subtree to the DOCX document with formatting preservation
+
+        The tree is walked depth-first with an explicit stack of child iterators
+        rather than recursion. Handlers return the children to walk next (or None);
+        tags without a handler are transparent containers. Adjacent plain text in
+        the same paragraph is coalesced into a single run.
+        """
+        stack = [iter(((element, paragraph),))]
+        pending = []
+        pending_paragraph = None
+
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                continue
+            node, par = entry
+
+            if isinstance(node, str):
+                # Text node
+                if par is None:
+                    if node.strip():
+                        doc.add_paragraph(node)
+                    continue
+                if par is not pending_paragraph:
+                    if pending:
+                        pending_paragraph.add_run(''.join(pending))
+                        pending.clear()
+                    pending_paragraph = par
+                pending.append(node)
+                continue
+
+            tag = node.tag
+            if not isinstance(tag, str):
+                # Comment / processing instruction
+                continue
+
+            handler = self._DOCX_TAG_HANDLERS.get(tag)
+            if handler is None:
+                # Unknown tag - walk its children in the current context
+                stack.append(self._docx_items(node, par))
+                continue
+
+            if pending:
+                pending_paragraph.add_run(''.join(pending))
+                pending.clear()
+            children = handler(self, node, doc, par)
+            if children is not None:
+                stack.append(children)
+
+        if pending:
+            pending_paragraph.add_run(''.join(pending))
+
+    def _docx_paragraph(self, element, doc, paragraph):
+        p = doc.add_paragraph()
+        p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        return self._docx_items(element, p)
+
+    def _docx_heading(self, element, doc, paragraph):
+        level = int(element.tag[1])
+        doc.add_heading(element.text_content(), level=level)
+        return None
+
+    def _docx_bold(self, element, doc, paragraph):
+        if paragraph:
+            paragraph.add_run(element.text_content()).bold = True
+        return None
+
+    def _docx_italic(self, element, doc, paragraph):
+        if paragraph:
+            paragraph.add_run(element.text_content()).italic = True
+        return None
+
+    def _docx_list(self, element, doc, paragraph):
+        # Generator: each item's paragraph is created only once the walk reaches it,
+        # so block content nested in an earlier item stays ahead of it
+        style_id = _LIST_STYLE_IDS[element.tag]
+        for li in element.iterchildren('li'):
             p = doc.add_paragraph()
-            p.paragraph_format.left_indent = Inches(0.5)
-            for child in element.children:
-                self._process_html_element_to_docx(child, doc, p)
-            return p
+            # Set pStyle directly: paragraph.style = 'List Bullet' does an XPath name lookup per item
+            p._p.style = style_id
+            yield from self._docx_items(li, p)
 
-        elif tag == 'div':
-            # Process div children
-            for child in element.children:
-                self._process_html_element_to_docx(child, doc)
+    def _docx_table(self, element, doc, paragraph):
+        rows = list(element.iter('tr'))
+        if not rows:
+            return None
 
-        else:
-            # Unknown tag - process children
-            if hasattr(element, 'children'):
-                for child in element.children:
-                    self._process_html_element_to_docx(child, doc, paragraph)
+        # Collect (text, is_header) per cell before touching the document
+        matrix = [
+            [(cell.text_content(), cell.tag == 'th') for cell in row.iter('th', 'td')]
+            for row in rows
+        ]
+
+        table = doc.add_table(rows=len(rows), cols=len(matrix[0]))
+        table.style = 'Light Grid Accent 1'
+
+        # table.rows / row.cells rebuild their proxies on every access, so fetch each once
+        for row_values, docx_row in zip(matrix, table.rows):
+            for (text, is_header), docx_cell in zip(row_values, docx_row.cells):
+                docx_cell.text = text
+                # Bold header cells (cell.text leaves exactly one run)
+                if is_header:
+                    docx_cell.paragraphs[0].runs[0].bold = True
+
+        return None
 
+    def _docx_break(self, element, doc, paragraph):
+        if paragraph:
+            paragraph.add_run('\n')
         return None
 
+    def _docx_blockquote(self, element, doc, paragraph):
+        p = doc.add_paragraph()
+        p.paragraph_format.left_indent = _BLOCKQUOTE_INDENT
+        return self._docx_items(element, p)
+
+    def _docx_div(self, element, doc, paragraph):
+        # Block container: children start their own paragraphs
+        return self._docx_items(element, None)
+
+    # Tag -> handler; anything not listed is treated as a transparent container
+    _DOCX_TAG_HANDLERS = {
+        'p': _docx_paragraph,
+        'h1': _docx_heading,
+        'h2': _docx_heading,
+        'h3': _docx_heading,
+        'strong': _docx_bold,
+        'b': _docx_bold,
+        'em': _docx_italic,
+        'i': _docx_italic,
+        'ul': _docx_list,
+        'ol': _docx_list,
+        'table': _docx_table,
+        'br': _docx_break,
+        'blockquote': _docx_blockquote,
+        'div': _docx_div,
+    }
+
     def html_to_docx(
         self,
         html_content: str,
@@ -369,20 +762,12 @@ class HTMLPDFGenerator:
         """
 
         # Create new document
-        doc = Document()
-
-        # Set margins
-        sections = doc.sections
-        for section in sections:
-            section.top_margin = Inches(1)
-            section.bottom_margin = Inches(1)
-            section.left_margin = Inches(1)
-            section.right_margin = Inches(1)
+        doc = _new_document()
 
-        # Add logo at top if available
+        # Add logo at top if available (checked first: add_picture creates its paragraph before opening the file)
         if logo_path and os.path.exists(logo_path):
             try:
-                doc.add_picture(logo_path, width=Inches(2.5))
+                doc.add_picture(logo_path, width=_LOGO_WIDTH)
                 last_paragraph = doc.paragraphs[-1]
                 last_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
             except Exception as e:
@@ -391,29 +776,24 @@ class HTMLPDFGenerator:
         # Add header info
         if recommender_info:
             header_p = doc.add_paragraph()
-            header_run = header_p.add_run(f"{recommender_info.get('name', '')}\n")
-            header_run.bold = True
-            header_run.font.size = Pt(12)
+            header_p.add_run(f"{recommender_info.get('name', '')}\n", style=_HEADER_NAME_STYLE)
 
-            if recommender_info.get('title'):
-                header_p.add_run(f"{recommender_info['title']}\n").font.size = Pt(10)
-            if recommender_info.get('company'):
-                header_p.add_run(f"{recommender_info['company']}\n").font.size = Pt(10)
-            if recommender_info.get('location'):
-                header_p.add_run(f"{recommender_info['location']}\n").font.size = Pt(10)
+            for key in ('title', 'company', 'location'):
+                if recommender_info.get(key):
+                    header_p.add_run(f"{recommender_info[key]}\n", style=_HEADER_DETAIL_STYLE)
 
         # Add date
-        date_p = doc.add_paragraph(datetime.now().strftime('%B %d, %Y'))
+        today = datetime.now()
+        date_p = doc.add_paragraph(f"{_MONTHS_EN[today.month - 1]} {today.day:02d}, {today.year}")
         date_p.add_run('\n')
 
         # CRITICAL FIX: Custom HTML to DOCX conversion preserving formatting
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            tree = lxml_html.fragment_fromstring(html_content, create_parent='div')
 
-            # Process top-level elements
-            for element in soup.children:
-                if hasattr(element, 'name') and element.name:  # Skip text nodes at root level
-                    self._process_html_element_to_docx(element, doc)
+            # Process top-level elements (text nodes at root level are skipped)
+            for element in tree.iterchildren():
+                self._process_html_element_to_docx(element, doc)
 
             print(f"✅ HTML converted to DOCX with formatting preservation")
 
@@ -422,14 +802,14 @@ class HTMLPDFGenerator:
             print(f"⚠️ HTML parsing error, using improved fallback: {e}")
 
             # Improved fallback: Parse and add with basic formatting
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = BeautifulSoup(html_content, 'lxml')
             for p_tag in soup.find_all('p'):
                 text = p_tag.get_text()
                 if text.strip():
                     doc.add_paragraph(text)
 
         # Create output directory if needed
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        _ensure_dir(os.path.dirname(output_path))
 
         # Save DOCX
         doc.save(output_path)
@@ -448,30 +828,21 @@ class HTMLPDFGenerator:
         """
         try:
             # Parse HTML to extract body content
-            soup = BeautifulSoup(complete_html, 'html.parser')
-            body = soup.find('body')
+            root = lxml_html.document_fromstring(complete_html)
+            body = root.find('body')
 
-            if not body:
+            if body is None:
                 raise ValueError("No <body> tag found in HTML")
 
             # Create new DOCX document
-            doc = Document()
-
-            # Set margins
-            sections = doc.sections
-            for section in sections:
-                section.top_margin = Inches(1)
-                section.bottom_margin = Inches(1)
-                section.left_margin = Inches(1)
-                section.right_margin = Inches(1)
+            doc = _new_document()
 
             # Process all elements in body
-            for element in body.children:
-                if hasattr(element, 'name') and element.name:
-                    self._process_html_element_to_docx(element, doc)
+            for element in body.iterchildren():
+                self._process_html_element_to_docx(element, doc)
 
             # Create output directory if needed
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            _ensure_dir(os.path.dirname(output_path))
 
             # Save DOCX
             doc.save(output_path)
@@ -483,61 +854,7 @@ class HTMLPDFGenerator:
             logger.error(f"DOCX generation failed: {e}")
             raise ValueError(f"Failed to generate DOCX: {e}")
 
-            doc = Document()
-            soup = BeautifulSoup(complete_html, 'html.parser')
-            
-            # Try to extract page margins from CSS if possible, otherwise default
-            # (Simplification: just use standard margins)
-            for section in doc.sections:
-                section.top_margin = Inches(1)
-                section.bottom_margin = Inches(1)
-                section.left_margin = Inches(1)
-                section.right_margin = Inches(1)
-
-            # Extract Body Content
-            body = soup.find('body')
-            if not body:
-                raise ValueError("No body tag found")
-
-            # Simple recursive parser to handle basic formatting
-            def process_element(element, paragraph=None):
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    p = doc.add_paragraph(style=f'Heading {element.name[1]}')
-                    p.add_run(element.get_text().strip())
-                elif element.name == 'p':
-                    p = doc.add_paragraph()
-                    # Process children for bold/italic
-                    for child in element.children:
-                        if child.name == 'strong' or child.name == 'b':
-                            p.add_run(child.get_text()).bold = True
-                        elif child.name == 'em' or child.name == 'i':
-                            p.add_run(child.get_text()).italic = True
-                        elif isinstance(child, str):
-                            p.add_run(child)
-                elif element.name == 'ul':
-                    for li in element.find_all('li', recursive=False):
-                        doc.add_paragraph(li.get_text().strip(), style='List Bullet')
-                elif element.name == 'ol':
-                    for li in element.find_all('li', recursive=False):
-                        doc.add_paragraph(li.get_text().strip(), style='List Number')
-                elif element.name == 'div':
-                    for child in element.children:
-                        if child.name: process_element(child)
-                # Handle other block elements...
-
-            # Start processing
-            for child in body.children:
-                if child.name:
-                    process_element(child)
-
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            doc.save(output_path)
-            print(f"✅ DOCX generated directly: {os.path.basename(output_path)}")
 
-        except Exception as e:
-            print(f"⚠️ DOCX direct generation failed, using fallback: {e}")
-            # Fallback to simple text extraction
-            self.html_to_docx(complete_html, output_path, {}, None, None)
 # Keep backward compatibility
 class DOCXGenerator(HTMLPDFGenerator):
     """Backward compatibility wrapper - now generates PDFs with HTML templates"""
@@ -1,100 +1,199 @@
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
+from pydantic import BaseModel, ConfigDict, ValidationError
+from functools import lru_cache
+from itertools import islice
+import hashlib
+import httpx
 import json
 import os
+import random
+import re
 import time
-from typing import Dict, List
+from typing import Any, Dict, List
 
+try:
+    # Optional speedup (orjson is not a declared dependency); errors subclass json.JSONDecodeError.
+    # json_loads is the decoder for LLM responses across app.core
+    import orjson
+    json_loads = orjson.loads
 
-class LLMProcessor:
-    def __init__(self):
-        # Using OpenRouter.ai - More cost-effective with multiple model options
-        # GPT-4o Mini: Fast and cheap for data extraction
-        # Gemini 2.5 Flash: High quality for content generation
-        # Claude 3.5 Sonnet: Best for HTML/document assembly
-        self.client = OpenAI(
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1"
+    def _json_dumps_bytes(obj, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+except ImportError:
+    json_loads = json.loads
+
+    def _json_dumps_bytes(obj, sort_keys: bool = False) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys).encode('utf-8')
+
+try:
+    import h2  # noqa: F401 - lets httpx negotiate HTTP/2
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 1000))  # Concurrent OpenRouter requests (SDK default; letters x block threads run ~50)
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 100))  # Idle connections kept for reuse
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 60))  # Seconds an idle connection is kept for reuse
+MAX_BACKOFF_SECONDS = 60  # Cap for rate-limit retry waits, including server Retry-After hints
+STORAGE_BASE_DIR = os.getenv('STORAGE_BASE_DIR', 'backend/storage')
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')  # Off by default: entries hold CV/testimony extractions
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(STORAGE_BASE_DIR, 'llm_cache'))  # clean_and_organize results keyed on request hash
+
+
+@lru_cache(maxsize=1)
+def openrouter_client() -> OpenAI:
+    """Process-wide OpenRouter client, so every LLMProcessor shares one keep-alive connection pool"""
+    return OpenAI(
+        api_key=os.getenv("OPENROUTER_API_KEY"),
+        base_url="https://openrouter.ai/api/v1",
+        http_client=DefaultHttpxClient(
+            http2=_HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            )
         )
+    )
 
-        self.models = {
-            "fast": "openai/gpt-4o-mini",
-            "quality": "google/gemini-2.5-flash",
-            "premium": "anthropic/claude-3.5-sonnet"
-        }
 
-        # Fallback models if primary fails (400/404 = invalid model ID)
-        self._fallback_models = {
-            "openai/gpt-4o-mini": ["google/gemini-2.5-flash", "anthropic/claude-3.5-sonnet"],
-            "google/gemini-2.5-flash": ["openai/gpt-4o-mini", "anthropic/claude-3.5-sonnet"],
-            "anthropic/claude-3.5-sonnet": ["openai/gpt-4o-mini", "google/gemini-2.5-flash"],
-        }
+def rate_limit_delay(exc: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying a rate-limited LLM call
 
-    def _call_llm(self, model: str, messages: list, **kwargs):
-        """Call LLM with automatic fallback on invalid model errors (400/404)."""
-        models_to_try = [model] + self._fallback_models.get(model, [])
-        last_error = None
-        for m in models_to_try:
-            try:
-                return self.client.chat.completions.create(
-                    model=m, messages=messages, **kwargs
-                )
-            except Exception as e:
-                err_str = str(e)
-                # Only fallback on model-not-found errors, not on rate limits or other issues
-                if "400" in err_str or "404" in err_str or "not a valid model" in err_str:
-                    print(f"Model {m} unavailable, trying fallback...")
-                    last_error = e
-                    continue
-                raise
-        raise last_error
-    
-    def clean_and_organize(self, extracted_texts: Dict) -> Dict:
-        testimonials_text = "\n\n---\n\n".join([
-            f"Testimonial {i+1}:\n{text}" 
-            for i, text in enumerate(extracted_texts.get('testimonials', []))
-        ])
-        
-        prompt = f"""# Role
-Você é um editor de documentos excepcional para ProEx Venture. 
-Pegue os inputs fragmentados e produza outputs estruturados em JSON.
+    Honors the Retry-After / retry-after-ms hint on the error's HTTP response;
+    otherwise exponential backoff with jitter so concurrent workers don't retry in lockstep.
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return min(MAX_BACKOFF_SECONDS, float(headers['retry-after-ms']) / 1000)
+        if headers.get('retry-after'):
+            return min(MAX_BACKOFF_SECONDS, float(headers['retry-after']))
+    except ValueError:
+        # HTTP-date form or garbage: fall back to our own schedule
+        pass
+    return min(MAX_BACKOFF_SECONDS, (2 ** attempt) * 3) + random.uniform(0, 2 ** attempt)
+
+
+# Leading ```/```lang fence and trailing ``` fence around LLM output
+_FENCE_RE = re.compile(r'\A\s*```[\w-]*[ \t]*\n?|\n?\s*```\s*\Z')
+
+
+def strip_code_fences(content: str) -> str:
+    """Remove a markdown code fence the model wrapped its whole answer in"""
+    return _FENCE_RE.sub('', content).strip()
+
+
+def _llm_cache_path(model: str, messages: list) -> str:
+    key = hashlib.sha256(_json_dumps_bytes({"model": model, "messages": messages}, sort_keys=True)).hexdigest()
+    return os.path.join(LLM_CACHE_DIR, f"{key}.json")
+
+
+def _read_llm_cache(path: str):
+    """Cached JSON result for a deterministic LLM call, or None on a miss or unreadable entry"""
+    try:
+        with open(path, 'rb') as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_llm_cache(path: str, result) -> None:
+    """Store a result atomically (write + rename) so concurrent readers never see a partial file"""
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_json_dumps_bytes(result))
+        os.replace(tmp_path, path)
+    except (OSError, TypeError) as e:
+        print(f"⚠️ Could not write LLM cache entry: {e}")
 
-# Inputs
-Quadro: {extracted_texts.get('quadro', '')}
 
-CV: {extracted_texts.get('cv', '')}
+class LLMOutputError(ValueError):
+    """LLM returned JSON that does not match the expected schema; the message is fed back when re-prompting"""
 
-Estrategia: {extracted_texts.get('estrategia', 'N/A')}
 
-OneNote: {extracted_texts.get('onenote', 'N/A')}
+class _LLMPayload(BaseModel):
+    # Unknown keys are kept so downstream .get() lookups see exactly what the model returned
+    model_config = ConfigDict(extra='allow')
 
-Testimonials:
-{testimonials_text}
+
+# Leaf values are only interpolated into prompts, so any JSON shape is accepted for them;
+# the schema pins down just the structure consumers iterate and call .get() on
+class Petitioner(_LLMPayload):
+    name: Any = None
+    education: Any = None
+    experience: Any = None
+
+
+class Testimony(_LLMPayload):
+    testimony_id: Any = None
+    recommender_name: Any = None
+    recommender_company: Any = None
+    recommender_company_website: Any = None
+    recommender_role: Any = None
+    recommender_location: Any = None
+    collaboration_period: Any = None
+    applicant_role: Any = None
+    testimony_text: Any = None
+    key_achievements: Any = None
+
+
+class PetitionerPayload(_LLMPayload):
+    """Schema of the clean_and_organize response (the validator is built once, at class creation)"""
+    petitioner: Petitioner
+    testimonies: List[Testimony]
+    strategy: Any = None
+    additional_documents: Any = None
+    onet: Any = None
+
+
+def _parse_organized(content: str) -> Dict:
+    """Decode and validate a clean_and_organize response, returning it as the plain dict callers expect"""
+    try:
+        payload = PetitionerPayload.model_validate_json(content)
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in err['loc']) or '(root)'}: {err['msg']}"
+            for err in e.errors(include_url=False)[:10]
+        )
+        raise LLMOutputError(problems) from e
+    return payload.model_dump(exclude_unset=True)
+
+
+# Invariant parts of the LLMProcessor prompts, hoisted out of the methods
+# Static role, schema and rules go in the system message, so providers can cache the prefix across calls
+_ORGANIZE_SYSTEM_PROMPT = """# Role
+Você é um editor de documentos excepcional para ProEx Venture. 
+Pegue os inputs fragmentados e produza outputs estruturados em JSON.
 
 # Output
 Retorne APENAS JSON válido (sem markdown, sem code fences):
-{{
-  "petitioner": {{
+{
+  "petitioner": {
     "name": "...",
     "education": ["..."],
     "experience": ["..."]
-  }},
-  "strategy": {{
+  },
+  "strategy": {
     "services_offered": ["..."],
     "target_clients": "..."
-  }},
+  },
   "additional_documents": [
-    {{
+    {
       "filename": "...",
       "text": "..."
-    }}
+    }
   ],
-  "onet": {{
+  "onet": {
     "representative_tasks": ["..."],
     "tools_and_technologies": ["..."],
     "work_activities_and_skills": ["..."]
-  }},
+  },
   "testimonies": [
-    {{
+    {
       "testimony_id": "1",
       "recommender_name": "...",
       "recommender_company": "...",
@@ -105,9 +204,9 @@ Retorne APENAS JSON válido (sem markdown, sem code fences):
       "applicant_role": "...",
       "testimony_text": "...",
       "key_achievements": ["..."]
-    }}
+    }
   ]
-}}
+}
 
 # Regras
 - Extraia TODOS os testemunhos (quantidade variável)
@@ -119,24 +218,133 @@ Retorne APENAS JSON válido (sem markdown, sem code fences):
 - Output em português
 - Retorne JSON puro sem markdown
 """
+
+_SEARCH_QUERY_PROMPT_HEADER = """# ROLE
+You are a search query optimization expert. Generate a highly specific, contextual search query.
+
+# INPUTS
+"""
+
+_SEARCH_QUERY_PROMPT_FOOTER = """
+
+# OUTPUT
+Generate ONE specific, contextual search query (2-4 sentences max) that would retrieve:
+- Relevant professional achievements and technical expertise
+- Specific accomplishments mentioned in this testimony
+- Industry-specific skills and methodologies
+- Measurable results and quantifiable impacts
+- Unique technical contributions
+
+Make the query SPECIFIC to this recommender's role, company, and the applicant's context.
+Avoid generic queries - be precise and actionable.
+
+Return ONLY the search query text, nothing else."""
+
+
+class LLMProcessor:
+    def __init__(self):
+        # Using OpenRouter.ai - More cost-effective with multiple model options
+        # GPT-4o Mini: Fast and cheap for data extraction
+        # Gemini 2.5 Flash: High quality for content generation
+        # Claude 3.5 Sonnet: Best for HTML/document assembly
+        self.client = openrouter_client()
+
+        self.models = {
+            "fast": "openai/gpt-4o-mini",
+            "quality": "google/gemini-2.5-flash",
+            "premium": "anthropic/claude-3.5-sonnet"
+        }
+
+        # Fallback models if primary fails (400/404 = invalid model ID)
+        self._fallback_models = {
+            "openai/gpt-4o-mini": ["google/gemini-2.5-flash", "anthropic/claude-3.5-sonnet"],
+            "google/gemini-2.5-flash": ["openai/gpt-4o-mini", "anthropic/claude-3.5-sonnet"],
+            "anthropic/claude-3.5-sonnet": ["openai/gpt-4o-mini", "google/gemini-2.5-flash"],
+        }
+
+    def _call_llm(self, model: str, messages: list, **kwargs):
+        """Call LLM with automatic fallback on invalid model errors (400/404)."""
+        models_to_try = [model] + self._fallback_models.get(model, [])
+        last_error = None
+        for m in models_to_try:
+            try:
+                return self.client.chat.completions.create(
+                    model=m, messages=messages, **kwargs
+                )
+            except Exception as e:
+                err_str = str(e)
+                # Only fallback on model-not-found errors, not on rate limits or other issues
+                if "400" in err_str or "404" in err_str or "not a valid model" in err_str:
+                    print(f"Model {m} unavailable, trying fallback...")
+                    last_error = e
+                    continue
+                raise
+        raise last_error
+    
+    def clean_and_organize(self, extracted_texts: Dict) -> Dict:
+        testimonials_text = "\n\n---\n\n".join([
+            f"Testimonial {i+1}:\n{text}" 
+            for i, text in enumerate(extracted_texts.get('testimonials', []))
+        ])
+        
+        inputs = "".join([
+            "# Inputs\nQuadro: ", extracted_texts.get('quadro', ''),
+            "\n\nCV: ", extracted_texts.get('cv', ''),
+            "\n\nEstrategia: ", extracted_texts.get('estrategia', 'N/A'),
+            "\n\nOneNote: ", extracted_texts.get('onenote', 'N/A'),
+            "\n\nTestimonials:\n", testimonials_text,
+        ])
+        messages = [
+            {"role": "system", "content": _ORGANIZE_SYSTEM_PROMPT},
+            {"role": "user", "content": inputs},
+        ]
+
+        # Same inputs give the same extraction (temperature 0), so repeat runs can reuse the stored result
+        cache_path = _llm_cache_path(self.models["fast"], messages) if LLM_CACHE_ENABLED else None
+        cached = _read_llm_cache(cache_path) if cache_path else None
+        if cached is not None:
+            print("♻️ clean_and_organize: using cached result")
+            return cached
         
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 response = self._call_llm(
                     model=self.models["fast"],
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={"type": "json_object"}
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    temperature=0
                 )
                 
                 content = response.choices[0].message.content
                 if content:
-                    return json.loads(content)
+                    result = _parse_organized(content)
+                    if cache_path:
+                        _write_llm_cache(cache_path, result)
+                    return result
                 raise ValueError("Empty response from LLM")
+            except LLMOutputError as e:
+                if attempt == max_retries - 1:
+                    # Still usable if it decodes to an object: consumers read it with .get() and defaults
+                    try:
+                        result = json_loads(content)
+                    except ValueError:
+                        result = None
+                    if isinstance(result, dict):
+                        print(f"⚠️ clean_and_organize output still fails validation ({e}); using it unvalidated")
+                        return result
+                    print(f"Error in clean_and_organize: invalid output ({e})")
+                    raise
+                # Let the model correct its own output instead of blindly asking again
+                print(f"⚠️ clean_and_organize output failed validation, re-prompting ({attempt + 1}/{max_retries}): {e}")
+                messages = messages + [
+                    {"role": "assistant", "content": content},
+                    {"role": "user", "content": f"O JSON acima não segue o schema: {e}. Retorne o JSON corrigido completo."},
+                ]
             except Exception as e:
                 if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 3
-                    print(f"⏳ Rate limit hit, waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                    wait_time = rate_limit_delay(e, attempt)
+                    print(f"⏳ Rate limit hit, waiting {wait_time:.1f}s before retry {attempt + 1}/{max_retries}...")
                     time.sleep(wait_time)
                     continue
                 if attempt == max_retries - 1:
@@ -147,33 +355,20 @@ Retorne APENAS JSON válido (sem markdown, sem code fences):
     
     def generate_search_query(self, testimony: Dict, context: Dict) -> str:
         """Generate an AI-based search query for vector search instead of static template"""
-        prompt = f"""# ROLE
-You are a search query optimization expert. Generate a highly specific, contextual search query.
-
-# INPUTS
-Recommender Name: {testimony.get('recommender_name', 'Unknown')}
-Recommender Role: {testimony.get('recommender_role', 'N/A')}
-Recommender Company: {testimony.get('recommender_company', 'N/A')}
-Collaboration Period: {testimony.get('collaboration_period', 'N/A')}
-Applicant Role in Context: {testimony.get('applicant_role', 'N/A')}
-Key Achievements: {json.dumps(testimony.get('key_achievements', []), ensure_ascii=False)}
-Testimony Excerpt: {testimony.get('testimony_text', '')[:500]}
-
-Petitioner Background: {json.dumps(context.get('petitioner', {}), ensure_ascii=False)[:500]}
-Strategy/Services: {json.dumps(context.get('strategy', {}), ensure_ascii=False)[:500]}
-
-# OUTPUT
-Generate ONE specific, contextual search query (2-4 sentences max) that would retrieve:
-- Relevant professional achievements and technical expertise
-- Specific accomplishments mentioned in this testimony
-- Industry-specific skills and methodologies
-- Measurable results and quantifiable impacts
-- Unique technical contributions
-
-Make the query SPECIFIC to this recommender's role, company, and the applicant's context.
-Avoid generic queries - be precise and actionable.
-
-Return ONLY the search query text, nothing else."""
+        prompt = "".join([
+            _SEARCH_QUERY_PROMPT_HEADER,
+            # str() keeps null fields from the organized JSON rendering as they did in the f-string
+            "Recommender Name: ", str(testimony.get('recommender_name', 'Unknown')),
+            "\nRecommender Role: ", str(testimony.get('recommender_role', 'N/A')),
+            "\nRecommender Company: ", str(testimony.get('recommender_company', 'N/A')),
+            "\nCollaboration Period: ", str(testimony.get('collaboration_period', 'N/A')),
+            "\nApplicant Role in Context: ", str(testimony.get('applicant_role', 'N/A')),
+            "\nKey Achievements: ", json.dumps(testimony.get('key_achievements', []), ensure_ascii=False),
+            "\nTestimony Excerpt: ", str(testimony.get('testimony_text') or '')[:500],
+            "\n\nPetitioner Background: ", json.dumps(context.get('petitioner', {}), ensure_ascii=False)[:500],
+            "\nStrategy/Services: ", json.dumps(context.get('strategy', {}), ensure_ascii=False)[:500],
+            _SEARCH_QUERY_PROMPT_FOOTER,
+        ])
         
         try:
             response = self._call_llm(
@@ -190,5 +385,5 @@ Return ONLY the search query text, nothing else."""
             # Fallback to a more intelligent static query if AI fails
             role = testimony.get('recommender_role', 'professional')
             company = testimony.get('recommender_company', 'company')
-            achievements = ", ".join(testimony.get('key_achievements', [])[:3])
+            achievements = ", ".join(islice(testimony.get('key_achievements') or (), 3))
             return f"Professional accomplishments and technical expertise of {role} at {company}. Key achievements: {achievements}"
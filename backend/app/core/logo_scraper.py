@@ -1,4 +1,5 @@
 import requests
+import re
 from bs4 import BeautifulSoup
 import os
 from typing import Optional, List
@@ -8,12 +9,70 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image
 import io
 import json
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration constants
 STORAGE_BASE_DIR = os.getenv('STORAGE_BASE_DIR', 'backend/storage')
 DEFAULT_REQUEST_TIMEOUT = 8  # Increased timeout
 MIN_LOGO_SIZE = 2000  # Minimum file size in bytes for quality logos
 MAX_LOGO_SIZE = 5000000  # 5MB max
+SCRAPE_MAX_HTML_BYTES = int(os.getenv('SCRAPE_MAX_HTML_BYTES', 256 * 1024))  # Leading bytes of a page searched for a logo
+LOGO_HTTP_POOL_SIZE = int(os.getenv('LOGO_HTTP_POOL_SIZE', 32))  # Kept-alive connections per host for logo lookups
+LOGO_HTTP_RETRIES = int(os.getenv('LOGO_HTTP_RETRIES', 2))  # Transport-level retries on connection errors and 502/503/504
+
+_URL_RE = re.compile(r'https?://[^\s]+')
+
+LOGOS_DIR = os.path.join(STORAGE_BASE_DIR, "logos")
+_LOGO_EXTENSIONS = ('.png', '.jpg', '.gif', '.svg')
+# First two bytes -> (full signature, extension) for format sniffing
+_IMAGE_MAGIC = {
+    b'\x89P': (b'\x89PNG', '.png'),
+    b'\xff\xd8': (b'\xff\xd8', '.jpg'),
+    b'GI': (b'GIF', '.gif'),
+}
+_SVG_TAG_RE = re.compile(rb'<svg', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _http_session() -> requests.Session:
+    """Process-wide session so logo lookups from every letter thread reuse TCP/TLS connections"""
+    session = requests.Session()
+    retries = Retry(
+        total=LOGO_HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False  # Hand back the last response so callers' status checks still apply
+    )
+    adapter = HTTPAdapter(pool_connections=LOGO_HTTP_POOL_SIZE, pool_maxsize=LOGO_HTTP_POOL_SIZE, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _safe_logo_name(company_identifier: str) -> str:
+    """Filesystem-safe stem for a stored logo"""
+    safe_name = "".join(c for c in company_identifier if c.isalnum() or c in (' ', '-', '_')).strip()
+    return safe_name.replace(' ', '_')
+
+
+@lru_cache(maxsize=1024)
+def _domain_of(website: str) -> str:
+    """Bare domain of a company website ("https://www.acme.com/x" -> "acme.com")"""
+    domain = urlparse(website).netloc or website
+    return domain.replace('www.', '')
+
+
+def _stored_logo(domain: str) -> Optional[str]:
+    """Path of a logo previously saved for this domain (by any run), if there is one"""
+    safe_name = _safe_logo_name(domain)
+    for ext in _LOGO_EXTENSIONS:
+        logo_path = f"{LOGOS_DIR}/{safe_name}{ext}"
+        if os.path.isfile(logo_path):
+            return logo_path
+    return None
 
 
 class LogoScraper:
@@ -21,6 +80,7 @@ class LogoScraper:
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
+        self.session = _http_session()
         self._logo_cache = {}
         self._domain_cache = {}
         self.brandfetch_key = os.environ.get('BRANDFETCH_API_KEY', '')
@@ -31,14 +91,11 @@ class LogoScraper:
         self.logodev_token = os.environ.get('LOGO_DEV_TOKEN', os.environ.get('LOGO_DEV_API_KEY', ''))
         self.max_parallel_methods = 4
 
-        # Initialize LLM for AI-powered company search
-        from openai import OpenAI
+        # Initialize LLM for AI-powered company search (shares LLMProcessor's connection pool)
         self.openrouter_key = os.environ.get('OPENROUTER_API_KEY', '')
         if self.openrouter_key:
-            self.llm_client = OpenAI(
-                api_key=self.openrouter_key,
-                base_url="https://openrouter.ai/api/v1"
-            )
+            from .llm_processor import openrouter_client
+            self.llm_client = openrouter_client()
         else:
             self.llm_client = None
     
@@ -154,14 +211,13 @@ class LogoScraper:
     def _try_brandfetch(self, website: str) -> Optional[str]:
         """Use Brandfetch API - excellent logo database"""
         try:
-            domain = urlparse(website).netloc or website
-            domain = domain.replace('www.', '')
+            domain = _domain_of(website)
             
             # Brandfetch API endpoint
             api_url = f"https://api.brandfetch.io/v2/brands/{domain}"
             headers = {**self.headers, 'Authorization': f'Bearer {self.brandfetch_key}'}
             
-            response = requests.get(api_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+            response = self.session.get(api_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
             if response.status_code == 200:
                 data = response.json()
                 # Try to get the logo from the response
@@ -169,7 +225,7 @@ class LogoScraper:
                 if logos and len(logos) > 0:
                     logo_url = logos[0].get('formats', [{}])[0].get('src')
                     if logo_url:
-                        logo_response = requests.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+                        logo_response = self.session.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
                         if logo_response.status_code == 200:
                             logo_path = self._save_logo(domain, logo_response.content)
                             print(f"✓ Logo found via Brandfetch: {domain}")
@@ -185,17 +241,23 @@ class LogoScraper:
         for attempt in range(max_retries):
             try:
                 # Extract domain from website
-                domain = urlparse(website).netloc or website
-                domain = domain.replace('www.', '')
+                domain = _domain_of(website)
+
+                # A logo fetched for this domain on an earlier run needs no round-trip
+                stored = _stored_logo(domain)
+                if stored:
+                    print(f"✓ Logo found on disk: {domain}")
+                    return stored
                 
                 clearbit_url = f"https://logo.clearbit.com/{domain}"
                 
-                response = requests.get(clearbit_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
-                if response.status_code == 200:
+                image_data = self._fetch_logo_bytes(clearbit_url)
+                if image_data:
                     # Save logo
-                    logo_path = self._save_logo(domain, response.content)
+                    logo_path = self._save_logo(domain, image_data)
                     print(f"✓ Logo found via Clearbit: {domain}")
                     return logo_path
+                break
             except requests.Timeout:
                 if attempt < max_retries - 1:
                     print(f"Clearbit timeout, retrying ({attempt + 1}/{max_retries})...")
@@ -236,7 +298,7 @@ class LogoScraper:
                 'Authorization': f'Bearer {self.logodev_secret_key}'
             }
             
-            response = requests.get(search_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+            response = self.session.get(search_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 results = response.json()
@@ -269,8 +331,7 @@ class LogoScraper:
             domain = None
             
             if website:
-                domain = urlparse(website).netloc or website
-                domain = domain.replace('www.', '')
+                domain = _domain_of(website)
             
             if not domain and company_name:
                 domain = self._search_logodev_domain(company_name, strategy="match")
@@ -280,7 +341,7 @@ class LogoScraper:
 
             logodev_url = f"https://img.logo.dev/{domain}?token={self.logodev_token}&size=256&format=png"
 
-            response = requests.get(logodev_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+            response = self.session.get(logodev_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
             if response.status_code == 200 and len(response.content) > 1000:
                 logo_path = self._save_logo(domain, response.content)
                 print(f"✓ Logo found via Logo.dev: {domain}")
@@ -315,11 +376,11 @@ class LogoScraper:
             
             for favicon_url in favicon_paths:
                 try:
-                    response = requests.get(favicon_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+                    response = self.session.get(favicon_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
                     if response.status_code == 200:
                         size = len(response.content)
                         if MIN_LOGO_SIZE <= size <= MAX_LOGO_SIZE:
-                            logo_path = self._save_logo(domain.replace('www.', ''), response.content)
+                            logo_path = self._save_logo(_domain_of(website), response.content)
                             print(f"✓ Logo found via favicon: {domain} ({size} bytes)")
                             return logo_path
                 except (requests.RequestException, IOError, OSError):
@@ -329,14 +390,57 @@ class LogoScraper:
         
         return None
     
+    def _fetch_logo_bytes(self, url: str) -> Optional[bytes]:
+        """
+        Download an image body, or return None for a miss.
+
+        Streams the response so placeholders and oversized files are rejected
+        from Content-Length (or once MAX_LOGO_SIZE is exceeded) without
+        reading the whole body; quality validation would discard them anyway.
+        """
+        with self.session.get(url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and not MIN_LOGO_SIZE <= int(declared) <= MAX_LOGO_SIZE:
+                return None
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=65536):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received > MAX_LOGO_SIZE:
+                    return None
+            return b''.join(chunks)
+
+    def _fetch_page_top(self, website: str) -> BeautifulSoup:
+        """Download and parse only the first SCRAPE_MAX_HTML_BYTES of a page
+
+        Logos sit in the head/header/nav at the top of the document, so the
+        rest of a large marketing page is not downloaded or parsed.
+        """
+        with self.session.get(website, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT, stream=True) as response:
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=8192):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= SCRAPE_MAX_HTML_BYTES:
+                    break
+            # Header charset when declared, otherwise BeautifulSoup sniffs <meta charset>
+            declared = 'charset' in response.headers.get('Content-Type', '').lower()
+            return BeautifulSoup(
+                b''.join(chunks)[:SCRAPE_MAX_HTML_BYTES], 'lxml',
+                from_encoding=response.encoding if declared else None
+            )
+
     def _scrape_website_logo(self, website: str) -> Optional[str]:
         """Scrape logo directly from company website - basic method"""
         try:
             if not website.startswith('http'):
                 website = f"https://{website}"
             
-            response = requests.get(website, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = self._fetch_page_top(website)
             
             logo_selectors = [
                 'img[class*="logo" i]',
@@ -346,16 +450,20 @@ class LogoScraper:
                 'header img:first-of-type',
             ]
             
+            # Match every selector first; overlapping selectors often hit the same <img>, which is fetched once
+            candidates = []
             for selector in logo_selectors:
                 logo = soup.select_one(selector)
                 if logo and logo.get('src'):
-                    logo_url = urljoin(website, str(logo['src']))
-                    logo_response = requests.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
-                    if logo_response.status_code == 200 and len(logo_response.content) >= MIN_LOGO_SIZE:
-                        domain = urlparse(website).netloc.replace('www.', '')
-                        logo_path = self._save_logo(domain, logo_response.content)
-                        print(f"✓ Logo scraped from website: {domain}")
-                        return logo_path
+                    candidates.append(urljoin(website, str(logo['src'])))
+
+            for logo_url in dict.fromkeys(candidates):
+                image_data = self._fetch_logo_bytes(logo_url)
+                if image_data and len(image_data) >= MIN_LOGO_SIZE:
+                    domain = _domain_of(website)
+                    logo_path = self._save_logo(domain, image_data)
+                    print(f"✓ Logo scraped from website: {domain}")
+                    return logo_path
         except Exception as e:
             print(f"Website scraping failed: {str(e)}")
         
@@ -367,8 +475,7 @@ class LogoScraper:
             if not website.startswith('http'):
                 website = f"https://{website}"
             
-            response = requests.get(website, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = self._fetch_page_top(website)
             
             # Comprehensive logo selectors
             logo_selectors = [
@@ -420,14 +527,14 @@ class LogoScraper:
                     pass
             
             # Try each logo URL
-            domain = urlparse(website).netloc.replace('www.', '')
+            domain = _domain_of(website)
             
             for logo_url, elem in found_logos:
                 if not logo_url:
                     continue
                 
                 try:
-                    logo_response = requests.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+                    logo_response = self.session.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
                     if logo_response.status_code == 200:
                         size = len(logo_response.content)
                         # Accept logos in 2KB-5MB range for quality variance
@@ -443,7 +550,7 @@ class LogoScraper:
                 if not logo_url:
                     continue
                 try:
-                    logo_response = requests.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+                    logo_response = self.session.get(logo_url, headers=self.headers, timeout=DEFAULT_REQUEST_TIMEOUT)
                     if logo_response.status_code == 200 and len(logo_response.content) > 500:
                         logo_path = self._save_logo(domain, logo_response.content)
                         print(f"✓ Logo scraped (advanced, relaxed): {domain}")
@@ -514,8 +621,7 @@ Official website URL:"""
             # Validate and clean the result
             if result and result != "NOT_FOUND" and ("http://" in result or "https://" in result):
                 # Extract URL if there's extra text
-                import re
-                url_match = re.search(r'https?://[^\s]+', result)
+                url_match = _URL_RE.search(result)
                 if url_match:
                     website = url_match.group(0).rstrip('.,;)')
                     print(f"  ✓ AI found website: {website}")
@@ -588,21 +694,17 @@ Official website URL:"""
             raise ValueError(f"Logo quality validation failed for {company_identifier}")
 
         # Create logos directory (use centralized configuration)
-        logos_dir = os.path.join(STORAGE_BASE_DIR, "logos")
+        logos_dir = LOGOS_DIR
         os.makedirs(logos_dir, exist_ok=True)
 
         # Clean company name for filename
-        safe_name = "".join(c for c in company_identifier if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_name = safe_name.replace(' ', '_')
+        safe_name = _safe_logo_name(company_identifier)
 
         # Detect image format from content
-        if image_data.startswith(b'\x89PNG'):
-            ext = '.png'
-        elif image_data.startswith(b'\xff\xd8'):
-            ext = '.jpg'
-        elif image_data.startswith(b'GIF'):
-            ext = '.gif'
-        elif b'<svg' in image_data[:100].lower():
+        magic = _IMAGE_MAGIC.get(image_data[:2])
+        if magic and image_data.startswith(magic[0]):
+            ext = magic[1]
+        elif _SVG_TAG_RE.search(image_data, 0, 100):
             ext = '.svg'
         else:
             ext = '.png'  # default
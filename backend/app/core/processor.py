@@ -57,20 +57,29 @@ class SubmissionProcessor:
         company_location = testimony.get('recommender_location', '')
         logo_path = None
 
-        if company_name:
-            progress_tracker.letter_step(submission_id, index, recommender_name, "logo_search", f"Buscando logo de {company_name}...")
-            progress_tracker.logo_search(submission_id, company_name, "searching")
-            logo_path = self.logo_scraper.get_company_logo(company_name, company_website, company_location)
-            if logo_path:
-                progress_tracker.logo_search(submission_id, company_name, "found")
-            else:
-                progress_tracker.logo_search(submission_id, company_name, "not_found")
+        # The logo lookup is network-bound and independent of the blocks, so it
+        # runs in the background while the blocks are generated
+        with ThreadPoolExecutor(max_workers=1) as logo_executor:
+            logo_future = None
+            if company_name:
+                progress_tracker.letter_step(submission_id, index, recommender_name, "logo_search", f"Buscando logo de {company_name}...")
+                progress_tracker.logo_search(submission_id, company_name, "searching")
+                logo_future = logo_executor.submit(
+                    self.logo_scraper.get_company_logo, company_name, company_website, company_location
+                )
 
-        # 2. Generate 5 blocks
-        print(f"    - Generating 5 blocks for {recommender_name}...")
-        progress_tracker.letter_step(submission_id, index, recommender_name, "blocks", "Gerando 5 blocos de conteúdo...")
-        blocks = self.block_generator.generate_all_blocks(testimony, design, organized_data)
-        print(f"    ✓ Blocks generated for {recommender_name}")
+            # 2. Generate 5 blocks
+            print(f"    - Generating 5 blocks for {recommender_name}...")
+            progress_tracker.letter_step(submission_id, index, recommender_name, "blocks", "Gerando 5 blocos de conteúdo...")
+            blocks = self.block_generator.generate_all_blocks(testimony, design, organized_data)
+            print(f"    ✓ Blocks generated for {recommender_name}")
+
+            if logo_future is not None:
+                logo_path = logo_future.result()
+                if logo_path:
+                    progress_tracker.logo_search(submission_id, company_name, "found")
+                else:
+                    progress_tracker.logo_search(submission_id, company_name, "not_found")
 
         # 3. DESIGN custom HTML (AI-powered, no templates!)
         print(f"    - Designing custom HTML for {recommender_name}...")
@@ -93,18 +102,14 @@ class SubmissionProcessor:
         output_dir = os.path.join(STORAGE_BASE_DIR, "outputs", submission_id)
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, f"letter_{index+1}_{recommender_name.replace(' ', '_')}.pdf")
-        print(f"    - Converting HTML to PDF for {recommender_name}...")
-        progress_tracker.letter_step(submission_id, index, recommender_name, "pdf_generation", "Convertendo para PDF...")
-
-        # Since letter_html is now a complete document, convert directly to PDF
-        self.pdf_generator.html_to_pdf_direct(letter_html, output_path)
-        print(f"    ✓ PDF generated for {recommender_name}")
-
         docx_output_path = output_path.replace('.pdf', '.docx')
-        print(f"    - Generating editable DOCX for {recommender_name}...")
-        progress_tracker.letter_step(submission_id, index, recommender_name, "docx_generation", "Gerando DOCX editável...")
-        self.pdf_generator.html_to_docx_direct(letter_html, docx_output_path)
-        print(f"    ✓ DOCX generated for {recommender_name}")
+        print(f"    - Converting HTML to PDF and DOCX for {recommender_name}...")
+        # Both files are rendered together below, so this is one progress step
+        progress_tracker.letter_step(submission_id, index, recommender_name, "pdf_docx_generation", "Gerando PDF e DOCX editável...")
+
+        # letter_html is a complete document: render PDF and DOCX side by side
+        self.pdf_generator.generate_both(letter_html, output_path, docx_output_path)
+        print(f"    ✓ PDF and DOCX generated for {recommender_name}")
         
         progress_tracker.letter_complete(submission_id, index, recommender_name, logo_path is not None)
 
@@ -386,6 +391,7 @@ class SubmissionProcessor:
             os.makedirs(output_dir, exist_ok=True)
 
             print(f"\nRegenerating content and PDFs...")
+            pdf_jobs = []
             for i, letter_idx in enumerate(letter_indices):
                 if letter_idx >= len(testimonials):
                     print(f"  ⚠️ Skipping invalid index: {letter_idx}")
@@ -432,14 +438,9 @@ class SubmissionProcessor:
 
 
                 output_path = os.path.join(output_dir, f"letter_{letter_idx+1}_{recommender_name.replace(' ', '_')}.pdf")
-                print(f"    - Converting HTML to PDF for {recommender_name}...")
-                self.pdf_generator.html_to_pdf_direct(letter_html, output_path)
-                print(f"    ✓ PDF generated for {recommender_name}")
-
                 docx_output_path = output_path.replace('.pdf', '.docx')
-                print(f"    - Generating editable DOCX for {recommender_name}...")
-                self.pdf_generator.html_to_docx_direct(letter_html, docx_output_path)
-                print(f"    ✓ DOCX generated for {recommender_name}")
+                # PDF and DOCX are rendered together after the loop (PDFs in a process pool)
+                pdf_jobs.append((letter_html, output_path, docx_output_path))
 
 
                 # Update letter info
@@ -449,6 +450,10 @@ class SubmissionProcessor:
                     "regenerated": True
                 })
 
+            print(f"\n    - Converting {len(pdf_jobs)} HTML letter(s) to PDF and DOCX...")
+            self.pdf_generator.generate_batch(pdf_jobs)
+            print(f"    ✓ {len(pdf_jobs)} PDF(s) and DOCX(s) generated")
+
             # Update processed data (save back as dict with design_structures key)
             design_structures_dict['design_structures'] = existing_designs
             processed_data['design_structures'] = design_structures_dict
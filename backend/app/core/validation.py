@@ -7,6 +7,11 @@ import re
 from typing import Dict, List, Tuple, Optional
 from collections import Counter
 
+_TOKEN_RE = re.compile(r"\w+|\S")
+_WORD_RE = re.compile(r'\w+')
+_SENTENCE_END_RE = re.compile(r'[.!?]+(?:\s+|$)')
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 # Forbidden phrases that sound too generic or template-like
 FORBIDDEN_PHRASES = {
@@ -61,7 +66,7 @@ def _tokenize(text: str) -> List[str]:
     """
     Tokenize text into words and punctuation
     """
-    return re.findall(r"\w+|\S", text.lower())
+    return _TOKEN_RE.findall(text.lower())
 
 
 def _ngrams(tokens: List[str], n: int) -> List[str]:
@@ -132,13 +137,13 @@ def avg_sentence_length(text: str) -> float:
         Average number of words per sentence
     """
     # Split by sentence endings
-    sentences = re.split(r'[.!?]+(?:\s+|$)', text.strip())
+    sentences = _SENTENCE_END_RE.split(text.strip())
     sentences = [s for s in sentences if s.strip()]
 
     if not sentences:
         return 0.0
 
-    word_counts = [len(re.findall(r'\w+', sentence)) for sentence in sentences]
+    word_counts = [len(_WORD_RE.findall(sentence)) for sentence in sentences]
     return sum(word_counts) / len(word_counts) if word_counts else 0.0
 
 
@@ -170,8 +175,8 @@ def validate_batch(letters: List[Dict]) -> Dict:
     for i, letter in enumerate(letters):
         text = letter.get('letter_html', '') or letter.get('text', '')
         # Remove HTML tags for comparison
-        text = re.sub(r'<[^>]+>', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _TAG_RE.sub(' ', text)
+        text = _WHITESPACE_RE.sub(' ', text).strip()
         texts.append(text)
 
     # 1. Check pairwise similarity (n-gram Jaccard)